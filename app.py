@@ -1,18 +1,142 @@
 """Multi Downloader 웹 서버 - Instagram, TikTok 지원"""
 import os
+import re
 import json
 import uuid
 import time
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 from flask import Flask, render_template, request, jsonify, Response, send_file
 from downloader import WebDownloader
 
 app = Flask(__name__)
+# 앞단 웹 서버(Apache/lighttpd 등)가 X-Sendfile로 파일을 직접 전송하게 할지 여부
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE') == '1'
 
-# 다운로드 작업 저장소
-tasks = {}
 downloader = WebDownloader()
 
+# 백그라운드 작업 풀 (동시 다운로드 수 제한, DOWNLOAD_WORKERS로 조정)
+DOWNLOAD_WORKERS = int(os.environ.get('DOWNLOAD_WORKERS', min(32, (os.cpu_count() or 1) * 4)))
+DOWNLOAD_POOL = ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS, thread_name_prefix='dl')
+CLEANUP_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cleanup')
+
+# SSE 설정
+SSE_KEEPALIVE = 15     # 변화가 없을 때 ping 주석을 보내는 간격 (초)
+SSE_DEBOUNCE = 0.05    # 연속된 갱신을 하나의 이벤트로 묶는 대기 시간 (초)
+
+# 작업 정리 설정
+SWEEP_INTERVAL = 30    # 만료 작업 검사 주기 (초)
+TASK_TTL = 600         # 작업 보관 시간 (초, 마지막 갱신/완료 시점부터)
+FAILED_TTL = 120       # 실패한 작업 보관 시간 (초)
+SERVED_TTL = 120       # 전송한 파일 보관 시간 (초, 수동 링크 재요청/이어받기용)
+
+# 파일명에 허용하지 않는 문자 (문자/숫자/공백/-/_ 외)
+_UNSAFE_FILENAME_RE = re.compile(r'[^\w \-]+')
+
+
+class TaskStore:
+    """스레드 안전한 다운로드 작업 저장소
+
+    모든 작업은 하나의 RLock을 공유하고, 작업별 Condition으로
+    SSE 스트림이 자신의 작업 변화만 기다릴 수 있게 한다.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        self._conds = {}
+        self._lock = threading.RLock()
+
+    def create(self, task_id: str, **fields):
+        """새 작업 등록"""
+        now = time.monotonic()
+        with self._lock:
+            self._tasks[task_id] = {
+                **fields,
+                'version': 0,
+                'created_at': now,
+                'updated_at': now,
+            }
+            self._conds[task_id] = threading.Condition(self._lock)
+
+    def update(self, task_id: str, **fields) -> bool:
+        """작업 상태 갱신 - 값이 바뀐 경우에만 대기자를 깨움 (같은 값이면 갱신 시각만). 작업이 없으면 False"""
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return False
+            task['updated_at'] = time.monotonic()
+            if all(task.get(k) == v for k, v in fields.items()):
+                return True
+            task.update(fields)
+            task['version'] += 1
+            self._conds[task_id].notify_all()
+            return True
+
+    def snapshot(self, task_id: str) -> Optional[dict]:
+        """작업 상태 복사본 반환"""
+        with self._lock:
+            task = self._tasks.get(task_id)
+            return dict(task) if task is not None else None
+
+    def wait_for_change(self, task_id: str, last_version: int, timeout: float) -> Optional[dict]:
+        """버전이 바뀔 때까지 대기 후 복사본 반환 (시간 초과 시 같은 버전, 삭제 시 None)"""
+        with self._lock:
+            cond = self._conds.get(task_id)
+            if cond is None:
+                return None
+            cond.wait_for(
+                lambda: task_id not in self._tasks or self._tasks[task_id]['version'] != last_version,
+                timeout=timeout,
+            )
+            return self.snapshot(task_id)
+
+    def delete(self, task_id: str) -> Optional[dict]:
+        """작업 삭제 - 삭제된 작업 반환"""
+        with self._lock:
+            task = self._tasks.pop(task_id, None)
+            cond = self._conds.pop(task_id, None)
+            if cond is not None:
+                cond.notify_all()
+            return task
+
+    def pop_expired(self) -> list:
+        """만료된 작업을 제거하고 반환"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                task_id for task_id, task in self._tasks.items()
+                if (task['status'] == 'failed' and now - task['updated_at'] > FAILED_TTL)
+                or (task['served_at'] is not None and now - task['served_at'] > SERVED_TTL)
+                # 완료된 작업도 완료(마지막 갱신) 시점부터 계산 - 대기열에서 기다린 시간은 포함하지 않음
+                or now - task['updated_at'] > TASK_TTL
+            ]
+            return [self.delete(task_id) for task_id in expired]
+
+
+# 다운로드 작업 저장소
+TASKS = TaskStore()
+
+
+def sweep_tasks():
+    """만료된 작업과 남은 파일 정리"""
+    for task in TASKS.pop_expired():
+        downloader.cleanup(task['filepath'])
+
+
+def _schedule_sweeps():
+    """주기적으로 정리 풀에 만료 작업 정리를 요청"""
+    while True:
+        time.sleep(SWEEP_INTERVAL)
+        try:
+            CLEANUP_POOL.submit(sweep_tasks)
+        except RuntimeError:
+            # 인터프리터 종료 중
+            return
+
+
+threading.Thread(target=_schedule_sweeps, name='task-sweeper', daemon=True).start()
+
 
 @app.route('/')
 def index():
@@ -50,20 +174,20 @@ def start_download():
 
     # 작업 ID 생성
     task_id = str(uuid.uuid4())[:8]
-    tasks[task_id] = {
-        'status': 'pending',
-        'progress': 0,
-        'message': '대기 중...',
-        'url': url,
-        'type': download_type,
-        'filepath': None,
-        'filename': None,
-    }
+    TASKS.create(
+        task_id,
+        status='pending',
+        progress=0,
+        message='대기 중...',
+        url=url,
+        type=download_type,
+        filepath=None,
+        filename=None,
+        served_at=None,
+    )
 
     # 백그라운드에서 다운로드 시작
-    thread = threading.Thread(target=run_download, args=(task_id, url, download_type))
-    thread.daemon = True
-    thread.start()
+    DOWNLOAD_POOL.submit(run_download, task_id, url, download_type)
 
     return jsonify({'task_id': task_id})
 
@@ -71,71 +195,87 @@ def start_download():
 def run_download(task_id: str, url: str, download_type: str):
     """백그라운드 다운로드 실행"""
     def progress_callback(percent: float, message: str):
-        tasks[task_id]['progress'] = percent
-        tasks[task_id]['message'] = message
-        tasks[task_id]['status'] = 'downloading'
+        TASKS.update(task_id, progress=percent, message=message, status='downloading')
 
     try:
-        tasks[task_id]['status'] = 'downloading'
-        tasks[task_id]['message'] = '다운로드 시작...'
+        # 대기열에 있는 동안 만료된 작업은 다운로드하지 않음
+        if not TASKS.update(task_id, status='downloading', message='다운로드 시작...'):
+            return
 
         if download_type == 'video':
-            filepath = downloader.download_video(url, task_id, progress_callback)
+            filepath, info = downloader.download_video(url, task_id, progress_callback)
             ext = 'mp4'
         else:
-            filepath = downloader.download_audio(url, task_id, progress_callback)
+            filepath, info = downloader.download_audio(url, task_id, progress_callback)
             ext = 'mp3'
 
-        if filepath and os.path.exists(filepath):
-            # 비디오 정보로 파일명 생성
-            info = downloader.get_video_info(url)
+        if filepath:
+            # 다운로드 시 받은 비디오 정보로 파일명 생성
             title = info['title'] if info else 'download'
             # 파일명에서 특수문자 제거
-            safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).strip()
-            safe_title = safe_title[:50] if len(safe_title) > 50 else safe_title
-
-            tasks[task_id]['status'] = 'completed'
-            tasks[task_id]['progress'] = 100
-            tasks[task_id]['message'] = '다운로드 완료!'
-            tasks[task_id]['filepath'] = filepath
-            tasks[task_id]['filename'] = f"{safe_title}.{ext}"
+            safe_title = _UNSAFE_FILENAME_RE.sub('', title).strip()[:50]
+
+            completed = TASKS.update(
+                task_id,
+                status='completed',
+                progress=100,
+                message='다운로드 완료!',
+                filepath=filepath,
+                filename=f"{safe_title}.{ext}",
+            )
+            if not completed:
+                # 다운로드 중 작업이 만료된 경우 파일만 남지 않도록 정리
+                downloader.cleanup(filepath)
         else:
-            tasks[task_id]['status'] = 'failed'
-            tasks[task_id]['message'] = '다운로드 실패'
+            downloader.cleanup_task(task_id)
+            # 다운로더가 남긴 오류 메시지가 있으면 그대로 표시
+            task = TASKS.snapshot(task_id)
+            message = task['message'] if task and task['message'].startswith('오류') else '다운로드 실패'
+            TASKS.update(task_id, status='failed', message=message)
 
     except Exception as e:
-        tasks[task_id]['status'] = 'failed'
-        tasks[task_id]['message'] = f'오류: {str(e)[:100]}'
+        downloader.cleanup_task(task_id)
+        TASKS.update(task_id, status='failed', message=f'오류: {str(e)[:100]}')
 
 
 @app.route('/api/progress/<task_id>')
 def get_progress(task_id: str):
     """SSE로 진행률 스트리밍"""
     def generate():
+        last_version = -1
+
         while True:
-            if task_id not in tasks:
+            # 상태가 바뀔 때까지 대기, 변화가 없으면 연결 유지용 ping 전송
+            task = TASKS.wait_for_change(task_id, last_version, SSE_KEEPALIVE)
+            if task is None:
                 yield f"data: {json.dumps({'error': 'Task not found'})}\n\n"
                 break
+            if task['version'] == last_version:
+                yield ": ping\n\n"
+                continue
+
+            # 짧은 간격으로 몰려오는 갱신은 하나로 묶어서 전송
+            if task['status'] not in ('completed', 'failed'):
+                time.sleep(SSE_DEBOUNCE)
+                task = TASKS.snapshot(task_id) or task
 
-            task = tasks[task_id]
+            last_version = task['version']
             data = {
                 'status': task['status'],
                 'progress': task['progress'],
                 'message': task['message'],
             }
 
-            if task['status'] == 'completed':
+            if data['status'] == 'completed':
                 data['download_url'] = f'/api/file/{task_id}'
                 yield f"data: {json.dumps(data)}\n\n"
                 break
-            elif task['status'] == 'failed':
+            elif data['status'] == 'failed':
                 yield f"data: {json.dumps(data)}\n\n"
                 break
             else:
                 yield f"data: {json.dumps(data)}\n\n"
 
-            time.sleep(0.5)
-
     return Response(generate(), mimetype='text/event-stream')
 
 
@@ -150,36 +290,33 @@ def download_file(task_id: str):
     </body></html>
     '''
 
-    if task_id not in tasks:
+    task = TASKS.snapshot(task_id)
+    if task is None:
         return error_html.format('다운로드가 만료되었습니다.'), 404, {'Content-Type': 'text/html; charset=utf-8'}
 
-    task = tasks[task_id]
     if task['status'] != 'completed' or not task['filepath']:
         return error_html.format('파일이 준비되지 않았습니다.'), 400, {'Content-Type': 'text/html; charset=utf-8'}
 
     filepath = task['filepath']
     filename = task['filename']
 
-    if not os.path.exists(filepath):
+    # 파일 전송 (gunicorn은 wsgi.file_wrapper를 통해 sendfile로 전송)
+    try:
+        response = send_file(
+            filepath,
+            as_attachment=True,
+            download_name=filename,
+            conditional=True,
+            max_age=0
+        )
+    except FileNotFoundError:
         return error_html.format('파일을 찾을 수 없습니다.'), 404, {'Content-Type': 'text/html; charset=utf-8'}
+    response.headers['X-Accel-Buffering'] = 'no'
 
-    # 파일 전송
-    response = send_file(
-        filepath,
-        as_attachment=True,
-        download_name=filename
-    )
-
-    # 5분 후 파일 삭제 (별도 스레드에서)
-    def cleanup_later():
-        time.sleep(300)
-        downloader.cleanup(filepath)
-        if task_id in tasks:
-            del tasks[task_id]
-
-    cleanup_thread = threading.Thread(target=cleanup_later)
-    cleanup_thread.daemon = True
-    cleanup_thread.start()
+    # 바로 지우지 않고 전송 시점만 기록 - 같은 링크 재요청/Range 이어받기를 위해
+    # SERVED_TTL 동안 남겨 두고 정리 스레드가 삭제 (HEAD 요청은 전송으로 보지 않음)
+    if request.method != 'HEAD':
+        TASKS.update(task_id, served_at=time.monotonic())
 
     return response
 
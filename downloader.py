@@ -1,10 +1,83 @@
 """웹 버전 다운로더 모듈 - Instagram, TikTok 지원 (yt-dlp 사용)"""
 import re
 import os
+import json
+import atexit
+import queue
+import shutil
+import logging
+import logging.handlers
 import tempfile
-from typing import Callable, Optional
+import time
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Callable, Optional, Tuple
 import yt_dlp
 
+# 로그는 큐에 넣고 별도 스레드에서 출력 (다운로드 스레드가 출력 스트림 잠금을 기다리지 않도록)
+log = logging.getLogger('ytdown')
+# 레벨 미만의 로그는 메시지 포맷팅 없이 버려짐 (YTDOWN_LOG_LEVEL로 조정, 예: DEBUG)
+_log_level = os.environ.get('YTDOWN_LOG_LEVEL', 'INFO').upper()
+_log_level_valid = isinstance(logging.getLevelName(_log_level), int)
+log.setLevel(_log_level if _log_level_valid else logging.INFO)
+log.propagate = False
+_log_queue = queue.SimpleQueue()
+log.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+if not _log_level_valid:
+    log.warning("알 수 없는 YTDOWN_LOG_LEVEL 값 %r - INFO로 설정", _log_level)
+
+
+class _ProgressThrottle:
+    """진행률 알림 빈도 제한 - 정수 퍼센트가 바뀌었거나 최소 간격이 지났을 때만 허용"""
+
+    def __init__(self, min_interval: float = 0.1):
+        self.min_interval = min_interval
+        self._last_time = 0.0
+        self._last_percent = -1
+
+    def ready(self, percent: float) -> bool:
+        now = time.monotonic()
+        int_percent = int(percent)
+        if now - self._last_time < self.min_interval and int_percent == self._last_percent:
+            return False
+        self._last_time = now
+        self._last_percent = int_percent
+        return True
+
+
+class _ProgressRelay:
+    """재사용되는 YoutubeDL에 고정 등록되는 진행률 훅 - 호출마다 실제 훅을 교체"""
+
+    def __init__(self):
+        self.hooks = []
+
+    def __call__(self, d):
+        for hook in self.hooks:
+            hook(d)
+
+
+class _InflightDownload:
+    """진행 중인 다운로드 - 결과 Future와 마지막 진행 상태를 기다리는 요청들과 공유"""
+
+    def __init__(self):
+        self.future = Future()
+        self.status = (0, "같은 영상을 받는 중인 요청을 기다리는 중...")
+
+    def relay(self, progress_callback: Optional[Callable[[float, str], None]]) -> Callable[[float, str], None]:
+        """진행 상태를 기록하면서 원래 콜백으로 전달하는 콜백 반환"""
+        def callback(percent: float, message: str):
+            self.status = (percent, message)
+            if progress_callback:
+                progress_callback(percent, message)
+        return callback
+
 
 class WebDownloader:
     """웹 서버용 다운로더 클래스 (YouTube/TikTok/Instagram)"""
@@ -18,233 +91,518 @@ class WebDownloader:
     )
 
     YOUTUBE_REGEX = re.compile(
-        r'(https?://)?(www\.|m\.)?(youtube\.com/(watch\?v=|shorts/)|youtu\.be/)[\w-]+'
+        r'(https?://)?(www\.|m\.)?(youtube\.com/(watch\?v=|shorts/)|youtu\.be/)([\w-]+)'
     )
 
+    # 플랫폼 판별용 통합 정규식 - 한 번의 매칭 후 m.lastgroup으로 플랫폼 확인
+    URL_REGEX = re.compile(
+        f'(?P<instagram>{INSTAGRAM_REGEX.pattern})'
+        f'|(?P<tiktok>{TIKTOK_REGEX.pattern})'
+        f'|(?P<youtube>{YOUTUBE_REGEX.pattern})'
+    )
+
+    # 웹에서 다운로드를 허용하는 플랫폼
+    SUPPORTED_PLATFORMS = ('instagram', 'tiktok')
+
+    # 재시도할 오류 메시지 패턴 (YouTube 차단/일시 오류 등)
+    RETRY_ERROR_REGEX = re.compile(r'403|forbidden|rate-limit|sign in|bot|unavailable', re.IGNORECASE)
+
+    INFO_CACHE_SIZE = 256
+    INFO_CACHE_TTL = 600   # 비디오 정보 캐시 유지 시간 (초)
+
+    # 재시도 포함 최대 다운로드 시도 횟수
+    MAX_ATTEMPTS = 4
+
+    # 같은 다운로드를 기다리는 요청이 진행 상태를 다시 전달하는 간격 (초)
+    INFLIGHT_REFRESH = 1.0
+
+    # yt-dlp 옵션 템플릿 (호출마다 얕은 복사 후 작업별 값만 덮어씀)
+    _BROWSER_HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36',
+        'Referer': 'https://www.instagram.com/',
+    }
+    _YOUTUBE_HEADERS = {
+        **_BROWSER_HEADERS,
+        'User-Agent': 'com.google.android.youtube/19.09.37 (Linux; U; Android 11) gzip',
+    }
+
+    # YouTube 재시도 시 차례로 시도할 클라이언트
+    YOUTUBE_CLIENTS = ('android', 'ios', 'tv_embedded', 'web')
+    _YOUTUBE_EXTRACTOR_ARGS = {
+        client: {
+            'youtube': {
+                'player_client': [client],
+                'player_skip': ['webpage', 'configs'],
+            }
+        }
+        for client in YOUTUBE_CLIENTS
+    }
+
+    _BASE_DOWNLOAD_OPTS = {
+        # 조각(DASH/HLS) 병렬 다운로드 및 구간 분할 요청
+        'concurrent_fragment_downloads': 4,
+        'http_chunk_size': 10 * 1024 * 1024,
+        'retries': 3,
+        'fragment_retries': 5,
+        # 응답이 멈춘 연결은 기본값(20초)보다 빨리 끊고 재시도
+        'socket_timeout': 15,
+        'http_headers': _BROWSER_HEADERS,
+    }
+    _BASE_VIDEO_OPTS = {
+        **_BASE_DOWNLOAD_OPTS,
+        'merge_output_format': 'mp4',
+        # 병합되지 않은 mp4 외 형식도 mp4로 리먹싱 (yt-dlp는 ffmpeg 출력에 +faststart를 붙여 moov를 앞에 둠)
+        'postprocessors': [{
+            'key': 'FFmpegVideoRemuxer',
+            'preferedformat': 'mp4',
+        }],
+        'quiet': False,
+        'no_warnings': False,
+    }
+    _BASE_AUDIO_OPTS = {
+        **_BASE_DOWNLOAD_OPTS,
+        # MP3는 CBR 320k 대신 최고 품질 VBR(-q:a 0, 평균 약 245kbps)로 인코딩
+        'postprocessors': [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': 'mp3',
+            'preferredquality': '0',
+        }],
+        # LAME 알고리즘 품질은 2로 고정 (빌드 기본값에 좌우되지 않도록)
+        'postprocessor_args': {
+            'extractaudio+ffmpeg_o': ['-compression_level', '2'],
+        },
+        'quiet': True,
+        'no_warnings': True,
+    }
+
+    # RAM 기반 임시 디렉토리 (tmpfs) 사용 조건
+    SHM_DIR = '/dev/shm'
+    SHM_MIN_FREE = 4 * 1024 ** 3
+
     def __init__(self):
-        self.temp_dir = tempfile.mkdtemp()
+        self.temp_dir = tempfile.mkdtemp(prefix='ytdown_', dir=self._temp_root())
+        self._info_cache = OrderedDict()
+        self._info_lock = threading.Lock()
+        # 스레드별 YoutubeDL 재사용 (YoutubeDL 인스턴스는 스레드 안전하지 않음)
+        self._local = threading.local()
+        self._ydl_instances = weakref.WeakSet()  # 종료 시 close()용, 스레드가 끝나면 함께 해제
+        self._ydl_lock = threading.Lock()
+        # 진행 중인 다운로드 ((URL 키, 음원 여부) -> _InflightDownload) - 같은 요청은 결과를 공유
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        atexit.register(self.close)
+
+    @classmethod
+    def _temp_root(cls) -> str:
+        """임시 파일 위치 결정 - YTDOWN_TMPDIR > 여유 공간이 충분한 /dev/shm > 시스템 기본값"""
+        override = os.environ.get('YTDOWN_TMPDIR')
+        if override:
+            os.makedirs(override, exist_ok=True)
+            return os.path.abspath(override)
+
+        try:
+            if os.path.isdir(cls.SHM_DIR) and shutil.disk_usage(cls.SHM_DIR).free > cls.SHM_MIN_FREE:
+                return cls.SHM_DIR
+        except OSError:
+            pass
+        return tempfile.gettempdir()
+
+    def _shared_ydl(self, ydl_opts: dict) -> yt_dlp.YoutubeDL:
+        """같은 옵션의 YoutubeDL 인스턴스를 현재 스레드에서 재사용
+
+        작업마다 달라지는 outtmpl과 progress_hooks는 키에서 빼고 호출할 때마다 교체한다.
+        진행률 훅은 조각 다운로드 스레드에서도 불리므로 인스턴스별 중계 훅으로 전달한다.
+        """
+        hooks = ydl_opts.get('progress_hooks', [])
+        outtmpl = ydl_opts.get('outtmpl')
+        base_opts = {k: v for k, v in ydl_opts.items() if k not in ('progress_hooks', 'outtmpl')}
+        key = json.dumps(base_opts, sort_keys=True)
+
+        cache = getattr(self._local, 'ydl_cache', None)
+        if cache is None:
+            cache = self._local.ydl_cache = {}
+
+        entry = cache.get(key)
+        if entry is None:
+            relay = _ProgressRelay()
+            entry = cache[key] = (yt_dlp.YoutubeDL({**base_opts, 'progress_hooks': [relay]}), relay)
+            with self._ydl_lock:
+                self._ydl_instances.add(entry[0])
+
+        ydl, relay = entry
+        relay.hooks = hooks
+        if outtmpl:
+            ydl.params['outtmpl']['default'] = outtmpl
+        return ydl
+
+    def _reset_shared_ydl(self):
+        """현재 스레드의 YoutubeDL 인스턴스 폐기 (실패 후 상태가 남지 않도록)"""
+        cache = getattr(self._local, 'ydl_cache', None) or {}
+        self._local.ydl_cache = {}
+        for ydl, _ in cache.values():
+            try:
+                ydl.close()
+            except Exception:
+                pass
+
+    def close(self):
+        """재사용 중인 YoutubeDL 인스턴스 정리"""
+        with self._ydl_lock:
+            instances = list(self._ydl_instances)
+            self._ydl_instances.clear()
+        for ydl in instances:
+            try:
+                ydl.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def classify(url: str) -> Optional[str]:
+        """URL 플랫폼 판별 ('instagram', 'tiktok', 'youtube' 또는 None)"""
+        m = WebDownloader.URL_REGEX.match(url)
+        return m.lastgroup if m else None
 
     def _is_youtube(self, url: str) -> bool:
         """YouTube URL인지 확인"""
-        return bool(self.YOUTUBE_REGEX.match(url))
+        return self.classify(url) == 'youtube'
 
     @staticmethod
     def validate_url(url: str) -> bool:
         """URL 유효성 검사 (TikTok/Instagram)"""
-        return bool(
-            WebDownloader.INSTAGRAM_REGEX.match(url) or
-            WebDownloader.TIKTOK_REGEX.match(url)
-        )
+        return WebDownloader.classify(url) in WebDownloader.SUPPORTED_PLATFORMS
+
+    @staticmethod
+    def _summarize_info(info: dict) -> dict:
+        """yt-dlp 정보에서 필요한 필드만 추출"""
+        return {
+            'title': info.get('title', 'video'),
+            'duration': info.get('duration', 0),
+            'thumbnail': info.get('thumbnail', ''),
+        }
+
+    def _info_cache_key(self, url: str) -> str:
+        """캐시 키 - YouTube는 영상 ID, 그 외는 쿼리/프래그먼트(추적 파라미터)를 뗀 URL"""
+        m = self.YOUTUBE_REGEX.match(url)
+        if m:
+            return f'youtube:{m.group(5)}'
+        return url.split('#', 1)[0].split('?', 1)[0]
+
+    def _cache_info(self, url: str, info: dict):
+        """URL별 비디오 정보 캐시 저장 (LRU + TTL)"""
+        key = self._info_cache_key(url)
+        with self._info_lock:
+            self._info_cache[key] = (time.monotonic(), info)
+            self._info_cache.move_to_end(key)
+            while len(self._info_cache) > self.INFO_CACHE_SIZE:
+                self._info_cache.popitem(last=False)
 
     def get_video_info(self, url: str) -> Optional[dict]:
-        """비디오 정보 추출"""
+        """비디오 정보 추출 (캐시 우선)"""
+        key = self._info_cache_key(url)
+        with self._info_lock:
+            cached = self._info_cache.get(key)
+            if cached is not None:
+                cached_at, info = cached
+                if time.monotonic() - cached_at < self.INFO_CACHE_TTL:
+                    self._info_cache.move_to_end(key)
+                    return info
+                del self._info_cache[key]
+
         ydl_opts = {
             'quiet': True,
             'no_warnings': True,
-            'extract_flat': False,
+            'extract_flat': 'in_playlist',
+            # 제목/길이/썸네일만 필요하므로 DASH/HLS 매니페스트 요청 생략
+            'extractor_args': {'youtube': {'skip': ['dash', 'hls']}},
         }
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                return {
-                    'title': info.get('title', 'video'),
-                    'duration': info.get('duration', 0),
-                    'thumbnail': info.get('thumbnail', ''),
-                }
+            ydl = self._shared_ydl(ydl_opts)
+            info = self._summarize_info(ydl.extract_info(url, download=False))
+            self._cache_info(url, info)
+            return info
         except Exception as e:
-            print(f"정보 추출 실패: {e}")
+            log.warning("정보 추출 실패: %s", e)
+            return None
+
+    @staticmethod
+    def _final_path(ydl: yt_dlp.YoutubeDL, info: dict, ext: str) -> Optional[str]:
+        """후처리(병합/변환)까지 끝난 최종 파일 경로 - 파일이 없으면 None"""
+        # yt-dlp가 후처리 후 경로를 requested_downloads에 기록함
+        downloads = info.get('requested_downloads') or [{}]
+        path = downloads[-1].get('filepath')
+        if not path:
+            path = os.path.splitext(ydl.prepare_filename(info))[0] + f'.{ext}'
+        try:
+            os.stat(path)
+        except FileNotFoundError:
             return None
+        return path
+
+    @staticmethod
+    def _progress_total(d: dict) -> float:
+        """진행률 계산용 전체 크기 - 서버가 크기를 알려주지 않으면 비트레이트 x 길이로 추정"""
+        total = d.get('total_bytes') or d.get('total_bytes_estimate')
+        if total:
+            return total
+        info = d.get('info_dict') or {}
+        tbr, duration = info.get('tbr'), info.get('duration')
+        if tbr and duration:
+            return tbr * 1000 / 8 * duration
+        return 0
+
+    def _task_dir(self, task_id: str) -> str:
+        """작업별 작업 디렉토리 (중간 파일까지 한 번에 정리하기 위함)"""
+        return os.path.join(self.temp_dir, task_id)
+
+    def _build_video_opts(self, task_id: str, is_youtube: bool, attempt: int, progress_hook: Callable) -> dict:
+        """영상 다운로드용 yt-dlp 옵션 생성"""
+        ydl_opts = self._BASE_VIDEO_OPTS.copy()
+        if attempt >= 2:
+            ydl_opts['format'] = 'best[ext=mp4]/best'
+        else:
+            # H.264 코덱 우선 선택 (iOS 호환)
+            ydl_opts['format'] = 'bestvideo[vcodec^=avc1]+bestaudio[acodec^=mp4a]/bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best'
+        ydl_opts['outtmpl'] = os.path.join(self._task_dir(task_id), f'{task_id}.%(ext)s')
+        ydl_opts['progress_hooks'] = [progress_hook]
+
+        # YouTube 전용 우회 옵션 (android, ios, tv, web 클라이언트를 차례로 시도)
+        if is_youtube:
+            client_to_use = self.YOUTUBE_CLIENTS[attempt % len(self.YOUTUBE_CLIENTS)]
+            ydl_opts['extractor_args'] = self._YOUTUBE_EXTRACTOR_ARGS[client_to_use]
+            ydl_opts['http_headers'] = self._YOUTUBE_HEADERS
+        return ydl_opts
+
+    def _build_audio_opts(self, task_id: str, is_youtube: bool, attempt: int, progress_hook: Callable) -> dict:
+        """음원 추출용 yt-dlp 옵션 생성"""
+        ydl_opts = self._BASE_AUDIO_OPTS.copy()
+        ydl_opts['format'] = 'best' if attempt >= 2 else 'bestaudio/best'
+        ydl_opts['outtmpl'] = os.path.join(self._task_dir(task_id), f'{task_id}.%(ext)s')
+        ydl_opts['progress_hooks'] = [progress_hook]
+
+        # YouTube 전용 우회 옵션
+        if is_youtube:
+            client_to_use = self.YOUTUBE_CLIENTS[attempt % len(self.YOUTUBE_CLIENTS)]
+            ydl_opts['extractor_args'] = self._YOUTUBE_EXTRACTOR_ARGS[client_to_use]
+            ydl_opts['http_headers'] = self._YOUTUBE_HEADERS
+        return ydl_opts
+
+    def _should_retry(
+        self,
+        error: Exception,
+        attempt: int,
+        progress_callback: Optional[Callable[[float, str], None]]
+    ) -> bool:
+        """다운로드 실패 처리 - 재시도할 오류면 True, 아니면 오류를 알리고 False"""
+        error_str = str(error)
+        log.error("다운로드 실패: %s", error)
+
+        # YouTube 및 기타 에러 시 재시도
+        if self.RETRY_ERROR_REGEX.search(error_str) and attempt < self.MAX_ATTEMPTS - 1:
+            if progress_callback:
+                progress_callback(0, f"재시도 중... ({attempt + 1}/{self.MAX_ATTEMPTS})")
+            return True
+
+        if progress_callback:
+            progress_callback(0, f"오류: {error_str[:100]}")
+        return False
+
+    def _shared_download(
+        self,
+        url: str,
+        task_id: str,
+        audio_only: bool,
+        progress_callback: Optional[Callable[[float, str], None]],
+        download: Callable,
+    ) -> Tuple[Optional[str], Optional[dict]]:
+        """같은 URL/형식의 다운로드가 진행 중이면 그 결과를 하드링크로 받고, 아니면 직접 다운로드"""
+        key = (self._info_cache_key(url), audio_only)
+        with self._inflight_lock:
+            inflight = self._inflight.get(key)
+            owner = inflight is None
+            if owner:
+                inflight = self._inflight[key] = _InflightDownload()
+
+        if owner:
+            result = (None, None)
+            try:
+                result = download(url, task_id, inflight.relay(progress_callback))
+                return result
+            finally:
+                with self._inflight_lock:
+                    self._inflight.pop(key, None)
+                inflight.future.set_result(result)
+
+        # 기다리는 동안 먼저 시작한 다운로드의 진행 상태를 주기적으로 전달 (작업이 유휴 만료되지 않도록)
+        while True:
+            if progress_callback:
+                progress_callback(*inflight.status)
+            try:
+                filepath, info = inflight.future.result(timeout=self.INFLIGHT_REFRESH)
+                break
+            except FutureTimeoutError:
+                continue
+
+        if filepath is None:
+            # 먼저 시작한 다운로드의 마지막 오류 메시지 전달
+            if progress_callback:
+                progress_callback(*inflight.status)
+            return None, None
+
+        task_dir = self._task_dir(task_id)
+        new_path = os.path.join(task_dir, task_id + os.path.splitext(filepath)[1])
+        os.makedirs(task_dir, exist_ok=True)
+        try:
+            os.link(filepath, new_path)
+        except FileNotFoundError:
+            # 먼저 끝난 작업의 파일이 이미 전송/삭제된 경우 직접 다운로드
+            return download(url, task_id, progress_callback)
+        except OSError:
+            shutil.copyfile(filepath, new_path)
+
+        if progress_callback:
+            progress_callback(100, "완료!")
+        return new_path, info
 
     def download_video(
         self,
         url: str,
         task_id: str,
-        progress_callback: Optional[Callable[[float, str], None]] = None,
-        _retry: int = 0
-    ) -> Optional[str]:
-        """영상 다운로드 - 파일 경로 반환"""
+        progress_callback: Optional[Callable[[float, str], None]] = None
+    ) -> Tuple[Optional[str], Optional[dict]]:
+        """영상 다운로드 - (파일 경로, 비디오 정보) 반환"""
+        return self._shared_download(url, task_id, False, progress_callback, self._download_video)
+
+    def download_audio(
+        self,
+        url: str,
+        task_id: str,
+        progress_callback: Optional[Callable[[float, str], None]] = None
+    ) -> Tuple[Optional[str], Optional[dict]]:
+        """음원 추출 (MP3) - (파일 경로, 비디오 정보) 반환"""
+        return self._shared_download(url, task_id, True, progress_callback, self._download_audio)
+
+    def _download_video(
+        self,
+        url: str,
+        task_id: str,
+        progress_callback: Optional[Callable[[float, str], None]] = None
+    ) -> Tuple[Optional[str], Optional[dict]]:
+        """영상 다운로드 실제 수행 (진행 중 다운로드 공유 없이)"""
+
+        throttle = _ProgressThrottle()
 
         def progress_hook(d):
             if d['status'] == 'downloading':
-                total = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
-                downloaded = d.get('downloaded_bytes', 0)
-                if total > 0:
-                    percent = (downloaded / total) * 100
+                total = self._progress_total(d)
+                downloaded = d.get('downloaded_bytes') or 0
+                percent = min(downloaded / total * 100, 100) if total > 0 else 0
+                if progress_callback and throttle.ready(percent):
                     speed = d.get('speed', 0)
                     speed_str = f"{speed / 1024 / 1024:.1f} MB/s" if speed else "계산 중..."
-                    if progress_callback:
+                    if total > 0:
                         progress_callback(percent, f"다운로드 중... {percent:.1f}% ({speed_str})")
+                    else:
+                        # 크기를 알 수 없으면 받은 용량만 표시
+                        progress_callback(0, f"다운로드 중... {downloaded / 1024 / 1024:.1f} MB ({speed_str})")
             elif d['status'] == 'finished':
                 if progress_callback:
                     progress_callback(95, "처리 중...")
 
         is_youtube = self._is_youtube(url)
 
-        if _retry >= 2:
-            video_format = 'best[ext=mp4]/best'
-        else:
-            # H.264 코덱 우선 선택 (iOS 호환)
-            video_format = 'bestvideo[vcodec^=avc1]+bestaudio[acodec^=mp4a]/bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best'
-
-        output_template = os.path.join(self.temp_dir, f'{task_id}.%(ext)s')
-
-        ydl_opts = {
-            'format': video_format,
-            'outtmpl': output_template,
-            'progress_hooks': [progress_hook],
-            'merge_output_format': 'mp4',
-            'quiet': False,
-            'no_warnings': False,
-            'http_headers': {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36',
-                'Referer': 'https://www.instagram.com/',
-            },
-        }
-
-        # YouTube 전용 우회 옵션
-        if is_youtube:
-            # 클라이언트 목록: android, ios, web, tv 등을 시도
-            clients = ['android', 'ios', 'tv_embedded', 'web']
-            client_to_use = clients[_retry % len(clients)]
-            ydl_opts['extractor_args'] = {
-                'youtube': {
-                    'player_client': [client_to_use],
-                    'player_skip': ['webpage', 'configs'],
-                }
-            }
-            ydl_opts['http_headers']['User-Agent'] = 'com.google.android.youtube/19.09.37 (Linux; U; Android 11) gzip'
-
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        for attempt in range(self.MAX_ATTEMPTS):
+            ydl_opts = self._build_video_opts(task_id, is_youtube, attempt, progress_hook)
+            try:
+                ydl = self._shared_ydl(ydl_opts)
                 info = ydl.extract_info(url, download=True)
-                filename = ydl.prepare_filename(info)
-                if not filename.endswith('.mp4'):
-                    base = os.path.splitext(filename)[0]
-                    if os.path.exists(base + '.mp4'):
-                        filename = base + '.mp4'
+                filename = self._final_path(ydl, info, 'mp4')
 
                 if progress_callback:
                     progress_callback(100, "완료!")
 
-                return filename if os.path.exists(filename) else None
+                if filename is None:
+                    return None, None
+                summary = self._summarize_info(info)
+                self._cache_info(url, summary)
+                return filename, summary
 
-        except Exception as e:
-            error_str = str(e)
-            print(f"다운로드 실패: {e}")
-
-            # YouTube 및 기타 에러 시 재시도
-            retry_keywords = ['403', 'Forbidden', 'rate-limit', 'Sign in', 'bot', 'unavailable']
-            should_retry = any(kw.lower() in error_str.lower() for kw in retry_keywords)
-
-            if should_retry and _retry < 3:
-                if progress_callback:
-                    progress_callback(0, f"재시도 중... ({_retry + 1}/4)")
-                return self.download_video(url, task_id, progress_callback, _retry + 1)
+            except Exception as e:
+                self._reset_shared_ydl()
+                if not self._should_retry(e, attempt, progress_callback):
+                    return None, None
 
-            if progress_callback:
-                progress_callback(0, f"오류: {error_str[:100]}")
-            return None
+        return None, None
 
-    def download_audio(
+    def _download_audio(
         self,
         url: str,
         task_id: str,
-        progress_callback: Optional[Callable[[float, str], None]] = None,
-        _retry: int = 0
-    ) -> Optional[str]:
-        """음원 추출 (MP3) - 파일 경로 반환"""
+        progress_callback: Optional[Callable[[float, str], None]] = None
+    ) -> Tuple[Optional[str], Optional[dict]]:
+        """음원 추출 (MP3) 실제 수행 (진행 중 다운로드 공유 없이)"""
+
+        throttle = _ProgressThrottle()
 
         def progress_hook(d):
             if d['status'] == 'downloading':
-                total = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
-                downloaded = d.get('downloaded_bytes', 0)
-                if total > 0:
-                    percent = (downloaded / total) * 100
+                total = self._progress_total(d)
+                downloaded = d.get('downloaded_bytes') or 0
+                percent = min(downloaded / total * 100, 100) if total > 0 else 0
+                if progress_callback and throttle.ready(percent):
                     speed = d.get('speed', 0)
                     speed_str = f"{speed / 1024 / 1024:.1f} MB/s" if speed else "계산 중..."
-                    if progress_callback:
+                    if total > 0:
                         progress_callback(percent * 0.8, f"다운로드 중... {percent:.1f}% ({speed_str})")
+                    else:
+                        # 크기를 알 수 없으면 받은 용량만 표시
+                        progress_callback(0, f"다운로드 중... {downloaded / 1024 / 1024:.1f} MB ({speed_str})")
             elif d['status'] == 'finished':
                 if progress_callback:
                     progress_callback(85, "MP3 변환 중...")
 
         is_youtube = self._is_youtube(url)
 
-        if _retry >= 2:
-            audio_format = 'best'
-        else:
-            audio_format = 'bestaudio/best'
-
-        output_template = os.path.join(self.temp_dir, f'{task_id}.%(ext)s')
-
-        ydl_opts = {
-            'format': audio_format,
-            'outtmpl': output_template,
-            'progress_hooks': [progress_hook],
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '320',
-            }],
-            'quiet': True,
-            'no_warnings': True,
-            'http_headers': {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36',
-                'Referer': 'https://www.instagram.com/',
-            },
-        }
-
-        # YouTube 전용 우회 옵션
-        if is_youtube:
-            clients = ['android', 'ios', 'tv_embedded', 'web']
-            client_to_use = clients[_retry % len(clients)]
-            ydl_opts['extractor_args'] = {
-                'youtube': {
-                    'player_client': [client_to_use],
-                    'player_skip': ['webpage', 'configs'],
-                }
-            }
-            ydl_opts['http_headers']['User-Agent'] = 'com.google.android.youtube/19.09.37 (Linux; U; Android 11) gzip'
-
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-
-                mp3_file = os.path.join(self.temp_dir, f'{task_id}.mp3')
-                if os.path.exists(mp3_file):
-                    if progress_callback:
-                        progress_callback(100, "완료!")
-                    return mp3_file
-
-                for f in os.listdir(self.temp_dir):
-                    if f.startswith(task_id) and f.endswith('.mp3'):
-                        if progress_callback:
-                            progress_callback(100, "완료!")
-                        return os.path.join(self.temp_dir, f)
-
-                return None
-
-        except Exception as e:
-            error_str = str(e)
-            print(f"다운로드 실패: {e}")
+        for attempt in range(self.MAX_ATTEMPTS):
+            ydl_opts = self._build_audio_opts(task_id, is_youtube, attempt, progress_hook)
+            try:
+                ydl = self._shared_ydl(ydl_opts)
+                info = ydl.extract_info(url, download=True)
+                summary = self._summarize_info(info)
+                self._cache_info(url, summary)
 
-            # YouTube 및 기타 에러 시 재시도
-            retry_keywords = ['403', 'Forbidden', 'rate-limit', 'Sign in', 'bot', 'unavailable']
-            should_retry = any(kw.lower() in error_str.lower() for kw in retry_keywords)
+                mp3_file = self._final_path(ydl, info, 'mp3')
+                if mp3_file is None:
+                    return None, None
 
-            if should_retry and _retry < 3:
                 if progress_callback:
-                    progress_callback(0, f"재시도 중... ({_retry + 1}/4)")
-                return self.download_audio(url, task_id, progress_callback, _retry + 1)
+                    progress_callback(100, "완료!")
+                return mp3_file, summary
 
-            if progress_callback:
-                progress_callback(0, f"오류: {error_str[:100]}")
-            return None
+            except Exception as e:
+                self._reset_shared_ydl()
+                if not self._should_retry(e, attempt, progress_callback):
+                    return None, None
+
+        return None, None
 
     def cleanup(self, filepath: str):
-        """임시 파일 삭제"""
+        """임시 파일 삭제 (비어 있는 작업 디렉토리도 함께 삭제)"""
+        if not filepath:
+            return
         try:
-            if filepath and os.path.exists(filepath):
-                os.remove(filepath)
-        except Exception as e:
-            print(f"파일 삭제 실패: {e}")
+            os.unlink(filepath)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log.warning("파일 삭제 실패: %s", e)
+
+        task_dir = os.path.dirname(filepath)
+        if os.path.dirname(task_dir) == self.temp_dir:
+            try:
+                os.rmdir(task_dir)
+            except OSError:
+                pass
+
+    def cleanup_task(self, task_id: str):
+        """작업 디렉토리 전체 삭제 (실패한 다운로드의 중간 파일 정리)"""
+        shutil.rmtree(self._task_dir(task_id), ignore_errors=True)